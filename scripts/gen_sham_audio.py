@@ -3,7 +3,12 @@ from __future__ import annotations
 """Generate sham audio masks for ultrasound experiments - static electricity crackling style."""
 
 import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 from scipy.io.wavfile import write
@@ -13,6 +18,189 @@ from scipy.signal import butter, sosfilt
 ROOT_DIR = Path(__file__).resolve().parent.parent
 DEFAULT_OUTPUT_DIR = ROOT_DIR / "sham_audio_static_crackle"
 
+# Peak level of every rendered pulse, and of the final file (fraction of full scale)
+PULSE_PEAK = 0.7
+OUTPUT_PEAK = 0.9
+
+
+@dataclass(frozen=True)
+class _CrackleParams:
+    """Settings shared by every file, passed along with each worker task."""
+    output_dir: Path
+    fs: int
+    total_duration: float
+    pulse_duration: float
+    n_groups: int
+    jitter_ms: float
+    pulse_samples: int
+    click_samples_count: int
+    envelope: np.ndarray
+    amplitude_variation: float
+    timing_jitter_within_pulse: float
+
+
+def _render_crackle_pulses(
+    rng: np.random.Generator,
+    sos: np.ndarray,
+    n_pulses: int,
+    n_clicks: int,
+    params: _CrackleParams,
+) -> np.ndarray:
+    """Render ``n_pulses`` independent 20ms crackle pulses, one per row.
+
+    All clicks of all pulses are drawn, filtered and shaped as one
+    (n_pulses, n_clicks, click_samples) block, so the per-click work is a
+    handful of array operations instead of a Python loop per pulse.
+    """
+    pulse_samples = params.pulse_samples
+    click_samples_count = params.click_samples_count
+    variation = params.amplitude_variation
+
+    # Click positions: evenly distributed base plus per-click jitter
+    base_positions = (np.arange(n_clicks) + 0.5) / n_clicks
+    jitter = (rng.random((n_pulses, n_clicks)) - 0.5) * params.timing_jitter_within_pulse * 0.3
+    positions = np.clip(base_positions + jitter, 0, 0.95)
+    start_idx = (positions * pulse_samples).astype(np.int64)
+
+    # Generate every click and high-pass filter them in a single call
+    raw_clicks = rng.standard_normal((n_pulses, n_clicks, click_samples_count), dtype=np.float32)
+    clicks = sosfilt(sos, raw_clicks, axis=-1)
+    clicks *= params.envelope
+
+    # Random amplitude variation (reduced per-click to avoid cumulative spikes)
+    amplitudes = 0.7 * (1.0 - variation + rng.random((n_pulses, n_clicks), dtype=np.float32) * variation)
+    clicks *= amplitudes[..., None]
+
+    # Insert clicks; the row is padded by one click so clicks running past the
+    # pulse end need no bounds checks and are simply cut by the final view.
+    # Within one click index every pulse gets exactly one click, so the
+    # fancy-indexed += never sees duplicate indices.
+    pulses = np.zeros((n_pulses, pulse_samples + click_samples_count), dtype=np.float32)
+    rows = np.arange(n_pulses)[:, None]
+    click_offsets = np.arange(click_samples_count)
+    for click_idx in range(n_clicks):
+        cols = start_idx[:, click_idx, None] + click_offsets
+        pulses[rows, cols] += clicks[:, click_idx]
+    pulses = pulses[:, :pulse_samples]
+
+    # Normalize each pulse to a consistent level (not full scale) to prevent
+    # explosive sounds
+    pulse_max = np.abs(pulses).max(axis=1)
+    nonzero = pulse_max > 0
+    pulses[nonzero] *= (PULSE_PEAK / pulse_max[nonzero])[:, None]
+
+    return pulses
+
+
+# Output buffer reused across all files rendered by one process
+_pcm_scratch: Optional[np.ndarray] = None
+
+
+def _pcm_buffer(n_samples: int) -> np.ndarray:
+    """Return this process's zeroed int16 output buffer of ``n_samples``."""
+    global _pcm_scratch
+    if _pcm_scratch is None or len(_pcm_scratch) != n_samples:
+        _pcm_scratch = np.zeros(n_samples, dtype=np.int16)
+    else:
+        _pcm_scratch.fill(0)
+    return _pcm_scratch
+
+
+def _write_wav(filename: Path, fs: int, pcm: np.ndarray) -> None:
+    """Write a PCM WAV, then tell the OS not to keep it in the page cache.
+
+    A full batch is ~140 MB of WAVs that this script never reads back, so
+    leaving them cached only evicts more useful pages. The kernel will not
+    drop dirty pages, so on POSIX each file is fdatasync'd first: every write
+    waits for the data to reach the disk.
+    """
+    with open(filename, "wb") as fh:
+        write(fh, fs, pcm)
+        if hasattr(os, "posix_fadvise"):
+            fh.flush()
+            os.fdatasync(fh.fileno())
+            os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _pulse_start_indices(
+    rng: np.random.Generator,
+    n_files: int,
+    params: _CrackleParams,
+) -> np.ndarray:
+    """Return the sample index of every pulse onset, shape (n_files, total_pulses)."""
+    fs = params.fs
+    pulse_duration = params.pulse_duration
+
+    # Pulse timing structure (same as original)
+    n_pulse_group = 5
+    target_group_duration_ms = 1000
+
+    # Generate timing pattern: every group of 5 pulses is jittered around an
+    # even spacing and then forced back to exactly 1000 ms, for all groups of
+    # all files at once
+    jitters = rng.uniform(-15, 15, (n_files, params.n_groups, n_pulse_group))
+    jitters -= jitters.mean(axis=-1, keepdims=True)
+    groups = np.round((target_group_duration_ms / n_pulse_group) + jitters)
+    groups[..., -1] += target_group_duration_ms - groups.sum(axis=-1)
+
+    if params.jitter_ms > 0:
+        groups += rng.uniform(-params.jitter_ms, params.jitter_ms, size=groups.shape)
+        np.clip(groups, pulse_duration * 1000 + 1, None, out=groups)
+
+    # Pulse k starts after k full pulse+silence periods; silence is
+    # truncated to whole samples per interval, as before.
+    intervals = groups.reshape(n_files, -1) / 1000.0
+    silence_lens = np.maximum(0, (fs * (intervals - pulse_duration)).astype(np.int64))
+    steps = params.pulse_samples + silence_lens
+    starts = np.zeros_like(steps)
+    np.cumsum(steps[:, :-1], axis=1, out=starts[:, 1:])
+    return starts
+
+
+def _generate_one(
+    file_idx: int,
+    n_clicks: int,
+    highpass_hz: float,
+    starts: np.ndarray,
+    seed_seq: np.random.SeedSequence,
+    params: _CrackleParams,
+) -> str:
+    """Render and write one crackle WAV; returns a one-line summary."""
+    rng = np.random.default_rng(seed_seq)
+    fs = params.fs
+    pulse_samples = params.pulse_samples
+
+    # Generate high-pass filter for sharp, high-frequency content
+    # (float32 coefficients keep sosfilt on the float32 path)
+    sos = butter(4, highpass_hz, btype='high', fs=fs, output='sos').astype(np.float32)
+
+    # Assemble full audio in one buffer of exactly the output length. Pulses
+    # starting past the end are never rendered, and at most one pulse
+    # straddles the end (pulses never overlap) and gets cut.
+    expected_len = int(fs * params.total_duration)
+    starts = starts[starts < expected_len]
+    pulses = _render_crackle_pulses(rng, sos, len(starts), n_clicks, params)
+
+    # Final normalization: every non-silent pulse peaks at exactly PULSE_PEAK,
+    # so the file peak is known without scanning the buffer. Scale the small
+    # pulse block straight to int16 units before placing it, instead of
+    # normalizing the whole 80 s buffer afterwards.
+    pulses *= OUTPUT_PEAK * 32767 / PULSE_PEAK
+
+    # The stores cast (truncate) straight to int16, so no full-length float
+    # buffer is ever built.
+    pcm = _pcm_buffer(expected_len)
+    n_whole = int(np.searchsorted(starts, expected_len - pulse_samples, side='right'))
+    pcm[starts[:n_whole, None] + np.arange(pulse_samples)] = pulses[:n_whole]
+    if n_whole < len(starts):
+        tail_start = starts[n_whole]
+        pcm[tail_start:] = pulses[n_whole, :expected_len - tail_start]
+
+    # Save to WAV file with descriptive naming
+    filename = params.output_dir / f"sham_crackle_n{n_clicks}_hp{int(highpass_hz)}Hz_{file_idx:02d}.wav"
+    _write_wav(filename, fs, pcm)
+    return f"Written: {filename.name} (clicks_per_pulse={n_clicks}, highpass={int(highpass_hz)}Hz)"
+
 
 def generate_static_crackle(
     output_dir: Path = DEFAULT_OUTPUT_DIR,
@@ -30,6 +218,8 @@ def generate_static_crackle(
     # --- Randomness/variation ---
     amplitude_variation: float = 0.6,  # Variation in click amplitude (0-1)
     timing_jitter_within_pulse: float = 0.4,  # Timing randomness within pulse (0-1)
+    seed: Optional[int] = None,  # RNG seed for reproducible output (None = fresh entropy)
+    n_workers: Optional[int] = None,  # Worker processes (None = all cores, 1 = in-process)
 ) -> None:
     """
     Generate static electricity crackling sounds for sham TUS audio.
@@ -51,16 +241,26 @@ def generate_static_crackle(
     - highpass_cutoff_hz: Higher values = sharper, more "electric" sound
     - amplitude_variation: More variation = more realistic
     - timing_jitter_within_pulse: Irregularity of clicks within pulse
+
+    Pass ``seed`` to make the generated files reproducible. Files are rendered
+    in parallel across ``n_workers`` processes; each file draws from its own
+    child seed, so the output does not depend on the worker count.
     """
 
     if n_files <= 0:
         raise ValueError("n_files must be > 0")
+    if n_workers is not None and n_workers <= 0:
+        raise ValueError("n_workers must be > 0")
     if total_pulses % 5 != 0:
         raise ValueError("total_pulses must be a multiple of 5")
 
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    # One independent child seed per file keeps output reproducible no matter
+    # which worker process renders which file; one more drives pulse timing.
+    timing_seed, *file_seeds = np.random.SeedSequence(seed).spawn(n_files + 1)
+
     # Generate parameter variations across files
     clicks_per_pulse_range = np.linspace(
         max(1, clicks_per_pulse - 2),
@@ -73,119 +273,45 @@ def generate_static_crackle(
         n_files
     )
 
-    # Pulse timing structure (same as original)
-    n_pulse_group = 5
-    target_group_duration_ms = 1000
-    n_groups = total_pulses // n_pulse_group
-
-    for file_idx in range(n_files):
-        samples = []
-        curr_clicks_per_pulse = int(clicks_per_pulse_range[file_idx])
-        curr_highpass = highpass_range[file_idx]
-
-        # Generate high-pass filter for sharp, high-frequency content
-        sos = butter(4, curr_highpass, btype='high', fs=fs, output='sos')
-
-        # Generate crackle-filled pulse
-        t_pulse = np.linspace(0, pulse_duration, int(fs * pulse_duration), endpoint=False)
-        pulse_samples = len(t_pulse)
-
-        def create_crackle_pulse():
-            """Create a single 20ms pulse filled with static crackle."""
-            pulse_audio = np.zeros(pulse_samples)
-
-            # Pre-calculate click sample count
-            click_samples_count = int(fs * click_duration_ms / 1000.0)
-
-            # Generate positions for clicks
-            positions = []
-            for click_idx in range(curr_clicks_per_pulse):
-                # Base position evenly distributed
-                base_position = (click_idx + 0.5) / curr_clicks_per_pulse
-                jitter = (np.random.rand() - 0.5) * timing_jitter_within_pulse * 0.3
-                position = np.clip(base_position + jitter, 0, 0.95)
-                positions.append(position)
-
-            # Distribute clicks across the 20ms pulse
-            for position in positions:
-                # Generate single click
-                raw_click = np.random.randn(click_samples_count)
-
-                # Apply high-pass filter
-                filtered_click = sosfilt(sos, raw_click)
-
-                # Softer exponential decay envelope to reduce sharpness
-                envelope = np.exp(-np.linspace(0, 6, click_samples_count))
-                click = filtered_click * envelope
-
-                # Random amplitude variation (reduced per-click to avoid cumulative spikes)
-                amplitude = 0.7 * (1.0 - amplitude_variation + np.random.rand() * amplitude_variation)
-                click *= amplitude
-
-                # Insert into pulse
-                start_idx = int(position * pulse_samples)
-                end_idx = min(start_idx + click_samples_count, pulse_samples)
-                actual_length = end_idx - start_idx
-
-                if actual_length > 0:
-                    pulse_audio[start_idx:end_idx] += click[:actual_length]
-
-            # Normalize each pulse to prevent explosive sounds
-            pulse_max = np.max(np.abs(pulse_audio))
-            if pulse_max > 0:
-                # Normalize to consistent level (not full scale)
-                pulse_audio = pulse_audio / pulse_max * 0.7
-
-            return pulse_audio
-
-        # Generate timing pattern (same as original)
-        full_intervals_sec = []
-        for _ in range(n_groups):
-            jitters = np.random.uniform(-15, 15, n_pulse_group)
-            jitters -= np.mean(jitters)
-            group = np.round((target_group_duration_ms / n_pulse_group) + jitters)
-
-            current_sum = np.sum(group)
-            diff = target_group_duration_ms - current_sum
-            group[-1] += diff
-
-            if jitter_ms > 0:
-                jitter = np.random.uniform(-jitter_ms, jitter_ms, size=n_pulse_group)
-                group += jitter
-                group = np.clip(group, pulse_duration * 1000 + 1, None)
-
-            full_intervals_sec.extend(group / 1000.0)
-
-        # Assemble full audio with crackle pulses
-        for interval in full_intervals_sec:
-            # Create new crackle pulse each time (variation)
-            crackle_pulse = create_crackle_pulse()
-            samples.append(crackle_pulse)
-
-            # Silence between pulses
-            silence_len = int(fs * (interval - pulse_duration))
-            silence_len = max(0, silence_len)
-            samples.append(np.zeros(silence_len))
-
-        audio = np.concatenate(samples)
-
-        # Trim/pad to exact duration
-        expected_len = int(fs * total_duration)
-        if len(audio) < expected_len:
-            audio = np.concatenate([audio, np.zeros(expected_len - len(audio))])
-        else:
-            audio = audio[:expected_len]
-
-        # Final normalization
-        max_val = np.max(np.abs(audio))
-        if max_val > 0:
-            audio = audio / max_val * 0.9
-        audio = np.clip(audio, -1.0, 1.0)
-
-        # Save to WAV file with descriptive naming
-        filename = output_dir / f"sham_crackle_n{curr_clicks_per_pulse}_hp{int(curr_highpass)}Hz_{file_idx:02d}.wav"
-        write(filename, fs, np.int16(audio * 32767))
-        print(f"Written: {filename.name} (clicks_per_pulse={curr_clicks_per_pulse}, highpass={int(curr_highpass)}Hz)")
+    # Pulse/click geometry and the click decay envelope are identical for
+    # every file and every click, so build them once up front.
+    pulse_samples = int(fs * pulse_duration)
+    click_samples_count = int(fs * click_duration_ms / 1000.0)
+    params = _CrackleParams(
+        output_dir=output_dir,
+        fs=fs,
+        total_duration=total_duration,
+        pulse_duration=pulse_duration,
+        n_groups=total_pulses // 5,
+        jitter_ms=jitter_ms,
+        pulse_samples=pulse_samples,
+        click_samples_count=click_samples_count,
+        # Softer exponential decay envelope to reduce sharpness
+        envelope=np.exp(-np.linspace(0, 6, click_samples_count, dtype=np.float32)),
+        amplitude_variation=amplitude_variation,
+        timing_jitter_within_pulse=timing_jitter_within_pulse,
+    )
+
+    # Pulse timing for every file is cheap and drawn in one batch up front;
+    # workers only synthesize and place the crackle.
+    starts_all = _pulse_start_indices(np.random.default_rng(timing_seed), n_files, params)
+
+    jobs = (
+        range(n_files),
+        [int(n) for n in clicks_per_pulse_range],
+        [float(hp) for hp in highpass_range],
+        starts_all,
+        file_seeds,
+        repeat(params),
+    )
+    # Files are fully independent, so render them on all cores.
+    if n_workers == 1:
+        for line in map(_generate_one, *jobs):
+            print(line)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as ex:
+            for line in ex.map(_generate_one, *jobs):
+                print(line)
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -225,6 +351,14 @@ Examples:
         "--total-duration", type=float, default=80.0,
         help="Total duration per file in seconds (default: 80.0)"
     )
+    parser.add_argument(
+        "--seed", type=int, default=None,
+        help="Random seed for reproducible output (default: unseeded)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, dest="n_workers",
+        help="Worker processes for parallel generation (default: all cores, 1 = serial)"
+    )
 
     # Pulse timing (matches FUS stimulation)
     timing_group = parser.add_argument_group("Pulse Timing (FUS stimulation parameters)")
@@ -281,6 +415,7 @@ def main() -> int:
     print("=" * 70)
     print(f"Output directory: {args.output_dir}")
     print(f"Files to generate: {args.n_files}")
+    print(f"Random seed: {args.seed if args.seed is not None else 'unseeded'}")
     print(f"\nPulse timing (matches FUS):")
     print(f"  Pulse duration: {args.pulse_duration * 1000:.1f} ms")
     print(f"  Total pulses: {args.total_pulses}")
@@ -307,6 +442,8 @@ def main() -> int:
         highpass_cutoff_hz=args.highpass_cutoff_hz,
         amplitude_variation=args.amplitude_variation,
         timing_jitter_within_pulse=args.timing_jitter_within_pulse,
+        seed=args.seed,
+        n_workers=args.n_workers,
     )
 
     print()
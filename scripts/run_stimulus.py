@@ -21,8 +21,9 @@ from __future__ import annotations
 import argparse
 import datetime as _dt
 import sys
+import threading
 import time
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, replace
 from pathlib import Path
 from typing import Optional
 
@@ -30,16 +31,8 @@ from typing import Optional
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT_DIR / "src"))
 
-try:
-    import utils.sg33500B as sg  # Siglent SDG33500B control wrapper
-except ModuleNotFoundError as e:
-    sg = None
-    _import_error = e
-except Exception as e:
-    sg = None
-    _import_error = e
-
 from utils.brainsight import BrainsightRecorder  # noqa: E402
+from utils.precise_timer import PreciseTimer  # noqa: E402
 
 ###############################################################################
 # Defaults
@@ -89,6 +82,7 @@ class Config:
     total_exposure_s: int     # total stimulus duration (s)
     audio_mask_file: Path     # path to WAV file for auditory mask
     no_mask: bool             # True = skip playing audio mask
+    precise_timing: bool      # True = wait on a Linux timerfd
 
     # Brainsight parallel recording
     brainsight_enabled: bool
@@ -103,7 +97,14 @@ class Config:
 
 
 class Logger:
-    """TSV logger for key timestamps and triggers."""
+    """TSV logger for key timestamps and triggers.
+
+    The file stays open for the whole session so logging a trigger is a
+    buffered write rather than an open/close pair. Call ``flush()`` at points
+    off the trigger deadline so a hard kill loses little, and ``close()`` when
+    the session ends; events logged after ``close()`` are dropped.
+    ``cfg.log_dir`` must already exist (see ``prepare_session``).
+    """
     _columns = ("time", "event", "details")
 
     def __init__(self, cfg: Config, stamp: Optional[str] = None):
@@ -113,48 +114,92 @@ class Logger:
         self.stamp = f"{cfg.participant_id}-{base_stamp}"
         fname = f"log-{self.stamp}.tsv"
         self.path = cfg.log_dir / fname
-        cfg.log_dir.mkdir(parents=True, exist_ok=True)
-        with open(self.path, "w", encoding="utf-8") as f:
-            f.write(f"VERSION=2; DATE={now}\n")
-            f.write("\t".join(self._columns) + "\n")
-            f.write(f"# {asdict(cfg)}\n")
+        self._fh = open(self.path, "w", encoding="utf-8", buffering=1 << 16)
+        self._fh.write(f"VERSION=2; DATE={now}\n")
+        self._fh.write("\t".join(self._columns) + "\n")
+        self._fh.write(f"# {asdict(cfg)}\n")
+        # The Brainsight recorder thread logs through the same handle.
+        self._lock = threading.Lock()
 
     def log(self, event: str, details: str = "") -> None:
         elapsed = time.time() - self.start_time
-        with open(self.path, "a", encoding="utf-8") as f:
-            f.write(f"{elapsed:.3f}\t{event}\t{details}\n")
+        with self._lock:
+            # A Brainsight thread that outlives stop() may still log here.
+            if self._fh.closed:
+                return
+            self._fh.write(f"{elapsed:.3f}\t{event}\t{details}\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._fh.closed:
+                self._fh.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
 
 ###############################################################################
 # Hardware wrappers
 ###############################################################################
 
 class AudioMask:
-    """Looping audio masker using pygame.mixer."""
+    """Looping audio masker on a PortAudio output stream (sounddevice).
+
+    The WAV is decoded into memory up front. ``_callback`` is Python and runs
+    under the GIL on PortAudio's thread once per block, so it does compete
+    with the trigger loop; a fixed ``BLOCKSIZE`` bounds how often (~43 Hz at
+    44.1 kHz) and keeps each call to a single short copy.
+    """
+
+    BLOCKSIZE = 1024  # frames per callback
 
     def __init__(self, wav_path: Path, logger: Logger):
         try:
-            import pygame  # only the mixer sub-module is used
+            import sounddevice as sd
         except ImportError as exc:
             raise RuntimeError(
-                "pygame is required for audio masking. Install it with "
-                "`pip install pygame` or run with --no-mask."
+                "sounddevice is required for audio masking. Install it with "
+                "`pip install sounddevice` or run with --no-mask."
             ) from exc
-        self._pygame = pygame
-        self._pygame.mixer.init()
-        if not wav_path.exists():
-            raise FileNotFoundError(f"Audio mask not found: {wav_path}")
-        self._sound = self._pygame.mixer.Sound(str(wav_path))
+        from scipy.io import wavfile
+
+        fs, data = wavfile.read(str(wav_path))
+        if data.dtype.kind == "f":
+            data = data.astype("float32", copy=False)  # PortAudio has no float64
+        # Always (frames, channels) so the callback can copy rows directly
+        self._data = data.reshape(len(data), -1)
+        self._pos = 0
+        self._stream = sd.OutputStream(
+            samplerate=fs,
+            channels=self._data.shape[1],
+            dtype=self._data.dtype.name,
+            callback=self._callback,
+            blocksize=self.BLOCKSIZE,
+            latency="low",
+        )
         self._logger = logger
 
+    def _callback(self, outdata, frames, time_info, status) -> None:
+        """Fill ``outdata`` from the WAV, wrapping around to loop it."""
+        data = self._data
+        pos = self._pos
+        written = 0
+        while written < frames:
+            chunk = min(frames - written, len(data) - pos)
+            outdata[written:written + chunk] = data[pos:pos + chunk]
+            written += chunk
+            pos = (pos + chunk) % len(data)
+        self._pos = pos
+
     def start(self):
         print("[INFO] Audio mask starting...")
-        self._sound.play(loops=-1)
+        self._stream.start()
         self._logger.log("mask_start")
 
     def stop(self):
         print("[INFO] Audio mask stopping...")
-        self._sound.stop()
-        self._pygame.mixer.quit()
+        self._stream.stop()
+        self._stream.close()
         self._logger.log("mask_stop")
 
 class Ultrasound:
@@ -164,20 +209,26 @@ class Ultrasound:
         self._cfg = cfg
         self._logger = logger
         self._serial: Optional[object] = None
+        self._sg = None  # driver module, imported on first real open()
 
     def open(self):
         if self._cfg.mock_hardware:
             print("[INFO] AWG mock open.")
             self._logger.log("awg_open_mock")
             return
-        if sg is None:
+        # Imported here rather than at module load: the driver pulls in
+        # pyvisa/pyserial, which mock runs and --help never need.
+        try:
+            import utils.sg33500B as sg  # Siglent SDG33500B control wrapper
+        except Exception as exc:
             raise RuntimeError(
                 f"Hardware driver 'sg33500B' could not be loaded.\n"
                 f"Please ensure you have run 'pip install -r requirements.txt' and that "
                 f"the drivers in 'src/utils/' are accessible."
-            )
+            ) from exc
+        self._sg = sg
         print("[INFO] Opening AWG serial connection...")
-        self._serial = sg.OpenSerial()
+        self._serial = self._sg.OpenSerial()
         print(f"[INFO] AWG serial opened: {self._serial}")
         self._logger.log("awg_open")
 
@@ -192,7 +243,7 @@ class Ultrasound:
             f"  Carrier: {cfg.center_freq_khz} kHz, Voltage: {cfg.input_vpp_mv} mVpp,\n"
             f"  Burst:   {burst_ms} ms, PRF: {cfg.prf_hz} Hz, Duty: {cfg.duty_cycle*100:.1f}%"
         )
-        ok = sg.uploadNewUSparameters(
+        ok = self._sg.uploadNewUSparameters(
             centerFreq_kHz=cfg.center_freq_khz,
             mode=1,
             inputmVpp=cfg.input_vpp_mv,
@@ -209,9 +260,9 @@ class Ultrasound:
         if self._cfg.mock_hardware:
             self._logger.log("ultrasound_trigger_mock")
             return
-        t0 = time.time()
-        sg.triggerFUS(self._serial)
-        latency = (time.time() - t0) * 1e3
+        t0 = time.perf_counter()
+        self._sg.triggerFUS(self._serial)
+        latency = (time.perf_counter() - t0) * 1e3
         self._logger.log("ultrasound_trigger", f"latency_ms={latency:.1f}")
 
     def close(self):
@@ -219,10 +270,12 @@ class Ultrasound:
             print("[INFO] AWG mock close.")
             self._logger.log("awg_close_mock")
             return
-        
+        if self._sg is None:
+            return  # driver never loaded, so nothing was opened
+
         # Explicitly turn off the output because Internal Triggering keeps running
         print("[INFO] Sending command to turn off AWG output...")
-        sg.turnOff()
+        self._sg.turnOff()
         self._logger.log("awg_output_off")
 
         if self._serial is not None:
@@ -253,89 +306,134 @@ def _validate_config(cfg: Config) -> None:
         joined = "\n- ".join(errors)
         raise ValueError(f"Invalid configuration:\n- {joined}")
 
+def prepare_session(cfg: Config) -> Config:
+    """Validate ``cfg`` and do all one-time filesystem setup for a session.
+
+    Returns a copy of ``cfg`` with absolute paths and an existing log
+    directory, so nothing after this point needs to stat or create paths.
+    """
+    _validate_config(cfg)
+    log_dir = cfg.log_dir.resolve()
+    log_dir.mkdir(parents=True, exist_ok=True)
+    return replace(
+        cfg,
+        log_dir=log_dir,
+        audio_mask_file=cfg.audio_mask_file.resolve(),
+    )
+
 ###############################################################################
 # Main protocol — continuous pulsing with fixed-rate bursts
 ###############################################################################
 
 def run_stim(cfg: Config) -> None:
-    _validate_config(cfg)
+    cfg = prepare_session(cfg)
     logger = Logger(cfg)
-    us = Ultrasound(cfg, logger)
-    mask: Optional[AudioMask] = None
-    if not cfg.no_mask:
-        mask = AudioMask(cfg.audio_mask_file, logger)
-
     recorder: Optional[BrainsightRecorder] = None
-    if cfg.brainsight_enabled:
-        recorder = BrainsightRecorder(
-            host=cfg.brainsight_host,
-            port=cfg.brainsight_port,
-            log_dir=cfg.log_dir,
-            session_stamp=logger.stamp,
-            logger=logger,
-        )
-        print(f"[INFO] Connecting to Brainsight at {cfg.brainsight_host}:{cfg.brainsight_port}...")
-        if recorder.start():
-            print(f"[INFO] Brainsight connected. Logging to:\n"
-                  f"  {recorder.raw_path}\n  {recorder.polaris_path}")
-            logger.log("brainsight_connected", f"{cfg.brainsight_host}:{cfg.brainsight_port}")
-        else:
-            print(
-                f"[WARN] Brainsight unreachable at {cfg.brainsight_host}:{cfg.brainsight_port} "
-                f"— continuing without tracking."
-            )
-            logger.log("brainsight_unavailable", f"{cfg.brainsight_host}:{cfg.brainsight_port}")
-            recorder = None
-
-    # Compute burst duration from PRF and duty cycle
-    period_ms = 1000.0 / cfg.prf_hz
-    burst_ms = int(period_ms * cfg.duty_cycle)
-    interval_s = period_ms / 1000.0
-    if burst_ms <= 0:
-        raise ValueError("Duty cycle and PRF result in <1 ms burst. Increase duty or PRF.")
-
-    print(f"[INFO] Starting continuous pulsing protocol ({cfg.total_exposure_s}s)")
-    us.open()
-    us.upload(burst_ms)
-    if mask:
-        mask.start()
-
-    start_time = time.time()
-    next_trigger = start_time
-    end_time = start_time + cfg.total_exposure_s
-    count = 0
-    status_interval = max(1.0, cfg.total_exposure_s / 10)
-    next_status = start_time + status_interval
-
     try:
-        while time.time() < end_time:
-            now = time.time()
-            if now >= next_trigger:
-                us.trigger()
-                count += 1
-                logger.log("trigger", f"#{count} @ {now - start_time:.3f}s")
-                next_trigger += interval_s
-            if now >= next_status:
-                elapsed = now - start_time
-                pct = elapsed / cfg.total_exposure_s * 100
+        us = Ultrasound(cfg, logger)
+        mask: Optional[AudioMask] = None
+        if not cfg.no_mask:
+            mask = AudioMask(cfg.audio_mask_file, logger)
+
+        if cfg.brainsight_enabled:
+            recorder = BrainsightRecorder(
+                host=cfg.brainsight_host,
+                port=cfg.brainsight_port,
+                log_dir=cfg.log_dir,
+                session_stamp=logger.stamp,
+                logger=logger,
+            )
+            print(f"[INFO] Connecting to Brainsight at {cfg.brainsight_host}:{cfg.brainsight_port}...")
+            if recorder.start():
+                print(f"[INFO] Brainsight connected. Logging to:\n"
+                      f"  {recorder.raw_path}\n  {recorder.polaris_path}")
+                logger.log("brainsight_connected", f"{cfg.brainsight_host}:{cfg.brainsight_port}")
+            else:
                 print(
-                    f"[INFO] Progress: {elapsed:.1f}/{cfg.total_exposure_s}s "
-                    f"({pct:.0f}%), {count} bursts"
+                    f"[WARN] Brainsight unreachable at {cfg.brainsight_host}:{cfg.brainsight_port} "
+                    f"— continuing without tracking."
                 )
-                next_status += status_interval
-            time.sleep(0.001)
-
-        print(f"[INFO] Completed {count} bursts in {cfg.total_exposure_s}s")
-        logger.log("burst_count", str(count))
-        print("[INFO] Protocol complete, exiting.")
+                logger.log("brainsight_unavailable", f"{cfg.brainsight_host}:{cfg.brainsight_port}")
+                recorder = None
+        # Persist the header and setup events before any hardware is touched
+        logger.flush()
+
+        # Compute burst duration from PRF and duty cycle
+        period_ms = 1000.0 / cfg.prf_hz
+        burst_ms = int(period_ms * cfg.duty_cycle)
+        interval_ns = round(1e9 / cfg.prf_hz)
+        if burst_ms <= 0:
+            raise ValueError("Duty cycle and PRF result in <1 ms burst. Increase duty or PRF.")
+
+        # Create the timer before the clock starts so the timerfd setup does not
+        # delay the first burst.
+        timer: Optional[PreciseTimer] = None
+        try:
+            if cfg.precise_timing:
+                timer = PreciseTimer()
+                logger.log("precise_timing", timer.mechanism)
+
+            print(f"[INFO] Starting continuous pulsing protocol ({cfg.total_exposure_s}s)")
+            us.open()
+            us.upload(burst_ms)
+            if mask:
+                mask.start()
+
+            # Deadlines are integer nanoseconds on perf_counter: wall-clock
+            # adjustments (NTP, DST) cannot stretch or skip bursts mid-session,
+            # and adding the interval 400 times accumulates no float rounding.
+            # Unlike monotonic (GetTickCount64, ~16 ms ticks on Windows before
+            # 3.13) it is QueryPerformanceCounter on Windows and
+            # CLOCK_MONOTONIC on Linux.
+            start_ns = time.perf_counter_ns()
+            next_trigger_ns = start_ns
+            end_ns = start_ns + cfg.total_exposure_s * 1_000_000_000
+            count = 0
+            status_interval_ns = round(max(1.0, cfg.total_exposure_s / 10) * 1e9)
+            next_status_ns = start_ns + status_interval_ns
+            now_ns = start_ns
+            while now_ns < end_ns:
+                if now_ns >= next_trigger_ns:
+                    us.trigger()
+                    count += 1
+                    logger.log("trigger", f"#{count} @ {(now_ns - start_ns) / 1e9:.3f}s")
+                    next_trigger_ns += interval_ns
+                if now_ns >= next_status_ns:
+                    elapsed = (now_ns - start_ns) / 1e9
+                    pct = elapsed / cfg.total_exposure_s * 100
+                    print(
+                        f"[INFO] Progress: {elapsed:.1f}/{cfg.total_exposure_s}s "
+                        f"({pct:.0f}%), {count} bursts"
+                    )
+                    next_status_ns += status_interval_ns
+                    # Off the trigger deadline: persist the log so far
+                    logger.flush()
+                # Sleep straight to the earliest pending deadline rather than
+                # polling every millisecond.
+                deadline_ns = min(next_trigger_ns, next_status_ns, end_ns)
+                if timer is not None:
+                    timer.wait_until(deadline_ns)
+                else:
+                    sleep_ns = deadline_ns - time.perf_counter_ns()
+                    if sleep_ns > 0:
+                        time.sleep(sleep_ns / 1e9)
+                now_ns = time.perf_counter_ns()
+
+            print(f"[INFO] Completed {count} bursts in {cfg.total_exposure_s}s")
+            logger.log("burst_count", str(count))
+            print("[INFO] Protocol complete, exiting.")
+        finally:
+            if mask:
+                mask.stop()
+            us.close()
+            if timer is not None:
+                timer.close()
     finally:
-        if mask:
-            mask.stop()
-        us.close()
         if recorder is not None:
             print("[INFO] Stopping Brainsight recorder...")
             recorder.stop()
         logger.log("quit")
+        logger.close()
 
 ###############################################################################
 # Interactive prompt flow
@@ -460,6 +558,7 @@ def interactive_config() -> Config:
         total_exposure_s=total_exposure_s,
         audio_mask_file=mask_path,
         no_mask=not mask_on,
+        precise_timing=False,
         brainsight_enabled=bs_on,
         brainsight_host=bs_host,
         brainsight_port=bs_port,
@@ -532,6 +631,10 @@ def build_parser() -> argparse.ArgumentParser:
         "--mask", type=Path, default=_default_mask_file(),
         help="WAV file for audio mask"
     )
+    parser.add_argument(
+        "--precise-timing", action="store_true",
+        help="Time bursts with a Linux timerfd (plain deadline sleep elsewhere)"
+    )
     parser.add_argument(
         "--no-brainsight", action="store_true",
         help="Do NOT record Brainsight tracking in parallel"
@@ -561,6 +664,7 @@ def _config_from_args(args) -> Config:
         total_exposure_s=args.duration,
         audio_mask_file=args.mask,
         no_mask=args.no_mask,
+        precise_timing=args.precise_timing,
         brainsight_enabled=not args.no_brainsight,
         brainsight_host=args.brainsight_host,
         brainsight_port=args.brainsight_port,
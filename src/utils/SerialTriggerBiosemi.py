@@ -5,6 +5,7 @@ except ImportError:
     raise
 import time
 import threading
+import queue
 
 # This code is for the Biosemi trigger interface.
 # The class inherits from the serial.Serial class, and so has all the same methods and attributes.
@@ -12,6 +13,8 @@ import threading
 # Same functionality can be achieved by using the built in methods of the serial.Serial class.
 # Besides the methods' documentation, check https://www.biosemi.com/faq/USB%20Trigger%20interface%20cable.htm for additional details.
 
+_STOP_WORKER = None  # queue sentinel telling the `queue_trigger` worker to exit
+
 
 class BiosemiTrigger(serial.Serial):
     """
@@ -33,6 +36,11 @@ class BiosemiTrigger(serial.Serial):
 
         To find your device's serial port, run `ls /dev/tty*` in the terminal, or `python -m serial.tools.list_ports` in python.
         """
+        # Set before opening: close() may run (e.g. from __del__) if opening fails.
+        self._trigger_lock = threading.Lock()
+        self._trigger_queue = queue.SimpleQueue()
+        self._trigger_worker = None
+        self._trigger_error = None
         super().__init__(Serial_Port, baudrate=115200)
         time.sleep(initial_delay)
 
@@ -84,10 +92,62 @@ class BiosemiTrigger(serial.Serial):
         pulse_thread.join()
         ```
         """
-        pulse_thread = threading.Thread(target=self.send_trigger, args=(signal_byte))
+        pulse_thread = threading.Thread(target=self.send_trigger, args=(signal_byte,))
         pulse_thread.start()
         return pulse_thread
 
+    def queue_trigger(self, signal_byte = 0b00000001):
+        """
+        Send a trigger pulse from a persistent background worker thread (does not block the main thread).
+
+        Unlike `thread_trigger`, no new thread is created per pulse: the byte is handed to a single
+        worker that is started on first use, so repeated triggers (e.g. one per ultrasound burst)
+        avoid the thread start-up cost. Pulses are sent in the order they were queued, and `close()`
+        sends anything still queued before closing the port.
+
+        The worker sends through `send_trigger`, so an invalid byte or a failed write is raised there.
+        Such an error stops the worker and is re-raised (as the cause of a RuntimeError) by the next
+        `queue_trigger` call.
+
+        Args:
+            signal_byte (int) - the byte (in binary, or int) to send to the Biosemi trigger interface. Defaults to 0b00000001,
+            which is the binary representation of 1, activating trigger 1.
+
+        Usage:
+        ```python
+        serialport.queue_trigger(signal_byte)
+        # returns immediately; the worker writes the byte to the serial port
+        ```
+        """
+        with self._trigger_lock:
+            if self._trigger_error is not None:
+                raise RuntimeError("Trigger worker stopped after a failed send") from self._trigger_error
+            if self._trigger_worker is None:
+                self._trigger_worker = threading.Thread(target=self._drain_triggers, daemon=True)
+                self._trigger_worker.start()
+            self._trigger_queue.put(signal_byte)
+
+    def _drain_triggers(self):
+        """Worker loop for `queue_trigger`: send each queued byte until told to stop."""
+        while True:
+            signal_byte = self._trigger_queue.get()
+            if signal_byte is _STOP_WORKER:
+                return
+            try:
+                self.send_trigger(signal_byte)
+            except Exception as e:
+                self._trigger_error = e
+                return
+
+    def close(self):
+        """Stop the `queue_trigger` worker after it has sent everything queued, then close the port."""
+        with self._trigger_lock:
+            worker, self._trigger_worker = self._trigger_worker, None
+        if worker is not None:
+            self._trigger_queue.put(_STOP_WORKER)
+            worker.join()
+        super().close()
+
     def test_trigger(self, signal_byte = 0b00000001):
         """Test if the connection is working by sending a quick pulse and printing a message."""
         try:
@@ -0,0 +1,84 @@
+"""
+High-resolution deadline waits for the stimulation loop.
+
+`PreciseTimer.wait_until(deadline_ns)` blocks until a `time.perf_counter_ns()`
+deadline:
+
+- Linux: a CLOCK_MONOTONIC timerfd armed at the absolute deadline
+  (perf_counter is CLOCK_MONOTONIC there). The read blocks in the kernel and
+  wakes on the hrtimer expiry, so there is no polling and no 1 ms floor.
+- Elsewhere: a plain `time.sleep` to the deadline. On Windows, CPython 3.11+
+  already sleeps on a high-resolution waitable timer.
+"""
+from __future__ import annotations
+
+import ctypes
+import os
+import sys
+import time
+
+CLOCK_MONOTONIC = 1
+TFD_CLOEXEC = 0o2000000
+TFD_TIMER_ABSTIME = 1
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+class _Itimerspec(ctypes.Structure):
+    _fields_ = [("it_interval", _Timespec), ("it_value", _Timespec)]
+
+
+class PreciseTimer:
+    """
+    Sleep to absolute perf_counter deadlines using the best OS timer available.
+
+    Usage:
+        timer = PreciseTimer()
+        try:
+            timer.wait_until(time.perf_counter_ns() + 200_000_000)
+        finally:
+            timer.close()
+    """
+
+    def __init__(self):
+        self._libc = None
+        self._fd: int | None = None
+
+        if sys.platform.startswith("linux"):
+            self._libc = ctypes.CDLL("libc.so.6", use_errno=True)
+            fd = self._libc.timerfd_create(CLOCK_MONOTONIC, TFD_CLOEXEC)
+            if fd < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, f"timerfd_create failed: {os.strerror(err)}")
+            self._fd = fd
+
+    @property
+    def mechanism(self) -> str:
+        """Short name of the timer in use, for session logs."""
+        return "timerfd" if self._fd is not None else "sleep"
+
+    def wait_until(self, deadline_ns: int) -> None:
+        """Block until ``time.perf_counter_ns() >= deadline_ns``.
+
+        Returns immediately if the deadline has already passed.
+        """
+        if self._fd is None:
+            remaining_ns = deadline_ns - time.perf_counter_ns()
+            if remaining_ns > 0:
+                time.sleep(remaining_ns / 1e9)
+            return
+
+        # One-shot absolute expiry; a deadline in the past fires at once.
+        sec, nsec = divmod(deadline_ns, 1_000_000_000)
+        spec = _Itimerspec(it_interval=_Timespec(0, 0), it_value=_Timespec(sec, nsec))
+        if self._libc.timerfd_settime(self._fd, TFD_TIMER_ABSTIME, ctypes.byref(spec), None) < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"timerfd_settime failed: {os.strerror(err)}")
+        os.read(self._fd, 8)  # expiration count; blocks until the deadline
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None